@@ -1,150 +1,462 @@
 import sys
-from collections import defaultdict, deque
+from array import array
+from functools import lru_cache
+from itertools import groupby
+from typing import Any, Callable, ClassVar, Dict, List, MutableSequence, Optional, Tuple, Union
 
+OP_MOVE = 0
+OP_ADD = 1
+OP_IN = 2
+OP_OUT = 3
+OP_JZ = 4
+OP_JNZ = 5
+OP_CLEAR = 6
+OP_ADD_MUL = 7
 
-class Memory:
-    def __init__(self, cell_size_bits):
-        self.registers = defaultdict(int)  # "unlimited" number of cells
-        self.cell_size = 2 ** cell_size_bits # default setting: one unsigned byte per cell
-        self.data_ptr = 0
+# why the numba kernel handed control back to Python
+STATUS_DONE = 0
+STATUS_GROW = 1
+STATUS_FLUSH = 2
+
+# one IR op: the opcode and its count, or (offset, factor) for OP_ADD_MUL
+Instruction = Tuple[int, Any]
 
-    def move(self, n):
-        self.data_ptr += n
 
-    def increment(self):
-        self.registers[self.data_ptr] = (self.registers[self.data_ptr] + 1) % self.cell_size
+class Memory:
+    TAPE_SIZE: ClassVar[int] = 65536
+
+    def __init__(self, cell_size_bits: int) -> None:
+        # the tape starts in the middle so the pointer can drift both ways; it grows when needed
+        self.tape: MutableSequence[int] = bytearray(self.TAPE_SIZE) if cell_size_bits <= 8 else [0] * self.TAPE_SIZE
+        self.mask: int = 2 ** cell_size_bits - 1  # default setting: one unsigned byte per cell
+        self.data_ptr: int = self.TAPE_SIZE // 2
+
+    def move(self, n: int) -> None:
+        p = self.data_ptr = self.data_ptr + n
+        if not 0 <= p < len(self.tape):
+            self.data_ptr = self.reserve(p)
+
+    def reserve(self, index: int) -> int:
+        # grows the tape until index fits; returns index shifted by whatever was prepended
+        while not 0 <= index < len(self.tape):
+            n = len(self.tape)
+            blank: Union[bytes, List[int]] = bytes(n) if isinstance(self.tape, bytearray) else [0] * n
+            if index < 0:
+                self.tape[0:0] = blank
+                self.data_ptr += n
+                index += n
+            else:
+                self.tape.extend(blank)
+        return index
+
+    # one read and one write per call; the mask doubles as the wraparound, so no branching
+    def add(self, n: int) -> None:
+        tape, p = self.tape, self.data_ptr
+        tape[p] = (tape[p] + n) & self.mask
+
+    def add_mul(self, offset: int, factor: int) -> None:
+        tape, target = self.tape, self.data_ptr + offset
+        if not 0 <= target < len(tape):
+            target = self.reserve(target)
+        value = tape[self.data_ptr]
+        if value:
+            tape[target] = (tape[target] + value * factor) & self.mask
 
-    def decrement(self):
-        self.registers[self.data_ptr] = (self.registers[self.data_ptr] - 1) % self.cell_size
+    def clear(self) -> None:
+        self.tape[self.data_ptr] = 0
 
-    def store(self, inp):
-        self.registers[self.data_ptr] = ord(inp)
-    
-    def get_current(self):
-        return self.registers[self.data_ptr]
+    def store(self, inp: int) -> None:
+        self.tape[self.data_ptr] = inp & self.mask
+
+    def get_current(self) -> int:
+        return self.tape[self.data_ptr]
 
 
 class InStream:
-    def __init__(self):
-        self.buffer = deque()
+    def __init__(self) -> None:
+        # input is kept as code points and consumed by moving pos, so get() allocates nothing
+        self.buffer = array("I")
+        self.pos = 0
 
-    def add(self, inp):
-        for val in list(inp):
-            self.buffer.append(val)
+    def add(self, inp: Union[str, bytes, bytearray]) -> None:
+        del self.buffer[:self.pos]
+        self.pos = 0
+        self.buffer.extend(inp if isinstance(inp, (bytes, bytearray)) else map(ord, inp))
 
-    def get(self):
-        return self.buffer.popleft() if self.buffer else None
+    def get(self) -> Optional[int]:
+        if self.pos < len(self.buffer):
+            value = self.buffer[self.pos]
+            self.pos += 1
+            return value
+        return None
 
 
 class OutStream:
-    def put(self, val):
-        sys.stdout.write(chr(val))
+    FLUSH_THRESHOLD: ClassVar[int] = 4096
+
+    def __init__(self) -> None:
+        self.buffer: List[int] = []
+
+    def put(self, val: int) -> None:
+        # collected and written out in chunks instead of one write and flush per char
+        self.buffer.append(val)
+        if len(self.buffer) >= self.FLUSH_THRESHOLD:
+            self.flush()
+
+    def flush(self) -> None:
+        sys.stdout.write("".join(map(chr, self.buffer)))
         sys.stdout.flush()
+        self.buffer.clear()
 
 
 class Program:
-    def __init__(self, code=None):
+    TOKENS: ClassVar[Dict[str, Instruction]] = {
+        ">": (OP_MOVE, +1),
+        "<": (OP_MOVE, -1),
+        "+": (OP_ADD, +1),
+        "-": (OP_ADD, -1),
+        ",": (OP_IN, 1),
+        ".": (OP_OUT, 1),
+        "[": (OP_JZ, 1),
+        "]": (OP_JNZ, 1)
+    }
+
+    def __init__(self, code: str) -> None:
         self.code = code
         self.i_ptr = 0
-        self.jump_table = self.__calculate_jump_table()
-
-    def __calculate_jump_table(self):
-        loop_stack = []
-        jump_table = [None] * len(code)
-        for i, op in enumerate(code):
-            if op == "[":
+        self.ops, self.jump_table = self.compile_source(code)
+
+    # everything derived from the source is read-only and cached on the code string, so
+    # reloading or resetting to the same program reuses the IR, jump table and generated code
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def compile_source(code: str) -> Tuple[Tuple[Instruction, ...], "array[int]"]:
+        ops = Program.__parse(code)
+        return tuple(ops), Program.__calculate_jump_table(ops)
+
+    @staticmethod
+    def __parse(code: str) -> List[Instruction]:
+        # anything that is not one of the eight commands is a comment and never reaches the IR;
+        # runs of +-<> are fused into a single (opcode, count) pair, even across comments
+        ops: List[Instruction] = []
+        for token, run in groupby(token for token in code if token in Program.TOKENS):
+            op, arg = Program.TOKENS[token]
+            if op in (OP_MOVE, OP_ADD):
+                ops.append((op, arg * sum(1 for _ in run)))
+            else:
+                for _ in run:
+                    ops.append((op, arg))
+                    if op == OP_JNZ:
+                        Program.__fold_loop(ops)
+        return ops
+
+    @staticmethod
+    def __fold_loop(ops: List[Instruction]) -> None:
+        # an innermost loop made only of +-<> that returns to its starting cell and
+        # decrements it once per pass is a clear ([-], [+]) or a multiply ([->+<])
+        start = len(ops) - 2
+        while start >= 0 and ops[start][0] in (OP_MOVE, OP_ADD):
+            start -= 1
+        if start < 0 or ops[start][0] != OP_JZ:
+            return
+
+        body = ops[start + 1:-1]
+        offset, deltas = 0, {}  # type: int, Dict[int, int]
+        for op, arg in body:
+            if op == OP_MOVE:
+                offset += arg
+            else:
+                deltas[offset] = deltas.get(offset, 0) + arg
+        if offset or not (deltas.get(0) == -1 or body == [(OP_ADD, +1)]):
+            return
+
+        ops[start:] = [(OP_ADD_MUL, (off, factor)) for off, factor in deltas.items() if off and factor]
+        ops.append((OP_CLEAR, 0))
+
+    @staticmethod
+    def __calculate_jump_table(ops: List[Instruction]) -> "array[int]":
+        loop_stack: List[int] = []
+        jump_table = array("i", [0]) * len(ops)  # only the bracket slots are ever read
+        for i, (op, _) in enumerate(ops):
+            if op == OP_JZ:
                 loop_stack.append(i)
-            elif op == "]":
+            elif op == OP_JNZ:
                 jump_table[i] = loop_stack.pop()
                 jump_table[jump_table[i]] = i
         return jump_table
 
-    def load_code(self, code):
+    def load_code(self, code: str) -> None:
         self.code = code
-        self.jump_table = self.__calculate_jump_table()
-
-    def get_opcode(self):
-        return self.code[self.i_ptr]
-
-    def current(self):
+        self.i_ptr = 0
+        self.ops, self.jump_table = self.compile_source(code)
+
+    def to_python(self) -> str:
+        # the IR as plain Python: one while loop per BF loop and no dispatch at all;
+        # the tape only has to be checked for growth where the pointer moves
+        lines = ["def run(tape, mask, stdin, stdout, reserve, p):"]
+        depth = 1
+        for op, arg in self.ops:
+            pad = "    " * depth
+            if op == OP_MOVE:
+                lines.append(f"{pad}p += {arg}")
+                if arg > 0:
+                    lines.append(f"{pad}if p >= len(tape): p = reserve(p)")
+                else:
+                    lines.append(f"{pad}if p < 0: p = reserve(p)")
+            elif op == OP_ADD:
+                lines.append(f"{pad}tape[p] = (tape[p] + {arg}) & mask")
+            elif op == OP_IN:
+                lines.append(f"{pad}value = stdin.get()")
+                lines.append(f"{pad}if value is not None: tape[p] = value & mask")
+            elif op == OP_OUT:
+                lines.append(f"{pad}stdout.put(tape[p])")
+            elif op == OP_JZ:
+                lines.append(f"{pad}while tape[p]:")
+                depth += 1
+            elif op == OP_JNZ:
+                if lines[-1].endswith(":"):
+                    lines.append(f"{pad}pass")
+                depth -= 1
+            elif op == OP_CLEAR:
+                lines.append(f"{pad}tape[p] = 0")
+            elif op == OP_ADD_MUL:
+                offset, factor = arg
+                if offset > 0:
+                    lines.append(f"{pad}if p + {offset} >= len(tape): p = reserve(p + {offset}) - {offset}")
+                else:
+                    lines.append(f"{pad}if p + {offset} < 0: p = reserve(p + {offset}) - {offset}")
+                lines.append(f"{pad}tape[p + {offset}] = (tape[p + {offset}] + tape[p] * {factor}) & mask")
+        lines.append("    return p")
+        return "\n".join(lines) + "\n"
+
+    def get_function(self) -> Optional[Callable[..., int]]:
+        return self.__build_function(self.code)
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def __build_function(code: str) -> Optional[Callable[..., int]]:
+        # None when Python refuses to compile the program, e.g. when its loops
+        # nest deeper than the compiler allows
+        namespace: Dict[str, Any] = {}
+        try:
+            exec(compile(Program(code).to_python(), "<brainfuck>", "exec"), namespace)
+        except (SyntaxError, RecursionError, MemoryError):
+            return None
+        function: Callable[..., int] = namespace["run"]
+        return function
+
+    def get_arrays(self) -> Tuple[Any, ...]:
+        return self.__build_arrays(self.code)
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def __build_arrays(code: str) -> Tuple[Any, ...]:
+        # the IR as parallel int arrays for the numba kernel: opcode, count/offset, factor, jump target
+        ops, args, factors = [], [], []  # type: List[int], List[int], List[int]
+        program = Program(code)
+        for op, arg in program.ops:
+            offset, factor = arg if op == OP_ADD_MUL else (arg, 0)
+            ops.append(op)
+            args.append(offset)
+            factors.append(factor)
+        return tuple(np.array(column, dtype=np.int64) for column in (ops, args, factors, program.jump_table))
+
+    def get_opcode(self) -> Instruction:
+        return self.ops[self.i_ptr]
+
+    def current(self) -> int:
         return self.i_ptr
 
-    def advance(self):
+    def advance(self) -> None:
         self.i_ptr += 1
 
-    def jump(self):
+    def jump(self) -> None:
         self.i_ptr = self.jump_table[self.i_ptr]
 
-    def eof(self):
-        return self.i_ptr >= len(self.code)
+    def eof(self) -> bool:
+        return self.i_ptr >= len(self.ops)
+
+
+def run_kernel(ops: Any, args: Any, factors: Any, jumps: Any, tape: Any, mask: int,
+               ip: int, p: int, inp: Any, in_pos: int, out: Any) -> Tuple[int, int, int, int, int, int]:
+    # the numba kernel, on numpy arrays: runs until the program ends, the tape needs to grow or the output
+    # buffer is full, then returns the status and the state to resume from
+    n, out_len = len(ops), 0
+    while ip < n:
+        op = ops[ip]
+        if op == OP_MOVE:
+            p += args[ip]
+            if p < 0 or p >= len(tape):
+                return STATUS_GROW, ip + 1, p, p, in_pos, out_len
+        elif op == OP_ADD:
+            tape[p] = (tape[p] + args[ip]) & mask
+        elif op == OP_IN:
+            if in_pos < len(inp):
+                tape[p] = inp[in_pos] & mask
+                in_pos += 1
+        elif op == OP_OUT:
+            if out_len == len(out):
+                return STATUS_FLUSH, ip, p, p, in_pos, out_len
+            out[out_len] = tape[p]
+            out_len += 1
+        elif op == OP_JZ:
+            if tape[p] == 0:
+                ip = jumps[ip]
+        elif op == OP_JNZ:
+            if tape[p] != 0:
+                ip = jumps[ip]
+        elif op == OP_CLEAR:
+            tape[p] = 0
+        elif op == OP_ADD_MUL:
+            target = p + args[ip]
+            if target < 0 or target >= len(tape):
+                return STATUS_GROW, ip, p, target, in_pos, out_len
+            tape[target] = (tape[target] + tape[p] * factors[ip]) & mask
+        ip += 1
+    return STATUS_DONE, ip, p, p, in_pos, out_len
+
+
+np: Any = None
+run_native: Any = None
+
+
+def load_numba() -> bool:
+    # the numba backend is optional and numba is slow to import, so it is only
+    # loaded the first time that backend is asked for; False when it is not available
+    global np, run_native
+    if run_native is None:
+        try:
+            import numpy
+            from numba import njit
+            run_native = njit(cache=True)(run_kernel)
+        except (ImportError, TypeError):
+            # TypeError: a mypyc build has already turned run_kernel into native code,
+            # which numba cannot read
+            return False
+        np = numpy
+    return True
 
 
 class BrainfuckVM:
-    def __init__(self, code=None, bits=8):
+    BACKENDS: ClassVar[Tuple[str, ...]] = ("compile", "interpret", "numba")
+    OUT_BUFFER_SIZE: ClassVar[int] = 4096
+
+    def __init__(self, code: Optional[str] = None, bits: int = 8, backend: str = "compile") -> None:
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "numba" and not load_numba():
+            raise RuntimeError("The numba backend needs numba and numpy, and does not work in a mypyc build.")
+        if backend == "numba" and bits > 8:
+            raise ValueError("The numba backend only supports cells of up to 8 bits.")
         self.bits = bits
+        self.backend = backend
         self.memory = Memory(bits)
         self.in_stream = InStream()
         self.out_stream = OutStream()
-        self.program = Program(code) if code else None
+        self.program: Optional[Program] = Program(code) if code else None
 
-        self.OPCODES = {
-            ">": self.__increment_data_ptr,
-            "<": self.__decrement_data_ptr,
-            "+": self.__increment_value,
-            "-": self.__decrement_value,
-            ",": self.__input_value,
-            ".": self.__output_value,
-            "[": self.__jump_if_zero,
-            "]": self.__jump_if_not_zero
-        }
-
-    def __increment_data_ptr(self):
-        self.memory.move(+1)
-
-    def __decrement_data_ptr(self):
-        self.memory.move(-1)
-
-    def __increment_value(self):
-        self.memory.increment()
-
-    def __decrement_value(self):
-        self.memory.decrement()
-
-    def __input_value(self):
+    def __input_value(self, _: Any) -> None:
         value = self.in_stream.get()
-        if value:
+        if value is not None:
             self.memory.store(value)
 
-    def __output_value(self):
+    def __output_value(self, _: Any) -> None:
         self.out_stream.put(self.memory.get_current())
 
-    def __jump_if_zero(self):
-        if not self.memory.get_current():
-            self.program.jump()
-
-    def __jump_if_not_zero(self):
-        if self.memory.get_current():
-            self.program.jump()
-
-    def __exec_opcode(self, opcode):
-        self.OPCODES[opcode]()
-
-    def reset(self, code=None):
+    def reset(self, code: Optional[str] = None) -> None:
         self.memory = Memory(self.bits)
         self.in_stream = InStream()
         self.out_stream = OutStream()
         self.program = Program(code) if code else None
 
-    def load_code(self, code):
+    def load_code(self, code: str) -> None:
         self.program = Program(code)
 
-    def load_input(self, inp):
+    def load_input(self, inp: Union[str, bytes, bytearray]) -> None:
         self.in_stream.add(inp)
 
-    def run_program(self):
-        while not self.program.eof():
-            self.__exec_opcode(self.program.get_opcode())
-            self.program.advance()
+    def run_program(self) -> int:
+        if self.program is None:
+            raise RuntimeError("No code loaded.")
+        try:
+            if self.backend == "numba":
+                return self.__run_native(self.program)
+            if self.backend == "compile":
+                return self.__run_compiled(self.program)
+            return self.__interpret(self.program)
+        finally:
+            self.out_stream.flush()
+
+    def __run_compiled(self, program: Program) -> int:
+        # the generated function always starts from the top, so a finished program stays finished
+        if program.eof():
+            return 0
+        function = program.get_function()
+        if function is None:
+            return self.__interpret(program)
+
+        memory = self.memory
+        memory.data_ptr = function(memory.tape, memory.mask, self.in_stream, self.out_stream,
+                                   memory.reserve, memory.data_ptr)
+        program.i_ptr = len(program.ops)
+        return 0
+
+    def __run_native(self, program: Program) -> int:
+        memory = self.memory
+        inp = np.array(self.in_stream.buffer, dtype=np.int64)
+        out = np.empty(self.OUT_BUFFER_SIZE, dtype=np.uint8)
+        status, ip, in_pos = STATUS_FLUSH, program.i_ptr, self.in_stream.pos
+
+        while status != STATUS_DONE:
+            # the view has to be dropped before the bytearray underneath can be resized
+            tape = np.frombuffer(memory.tape, dtype=np.uint8)
+            status, ip, memory.data_ptr, index, in_pos, out_len = run_native(
+                *program.get_arrays(), tape, memory.mask, ip, memory.data_ptr, inp, in_pos, out)
+            del tape
+
+            for value in out[:out_len]:
+                self.out_stream.put(int(value))
+            if status == STATUS_GROW:
+                memory.reserve(index)
+
+        self.in_stream.pos = in_pos
+        program.i_ptr = ip
+        return 0
+
+    def __interpret(self, program: Program) -> int:
+        # handlers are bound to locals once and picked by an if/elif chain, most frequent first,
+        # rather than through a tuple of handlers indexed by opcode: that way adds, moves and
+        # jumps are done inline and never pay for a lookup and a call;
+        # the memory ops go straight to Memory, which is safe because it cannot be replaced
+        # mid-run; jumps only touch the instruction pointer, which stays local until the end
+        memory = self.memory
+        ops, jumps = program.ops, program.jump_table
+        read, write = self.__input_value, self.__output_value
+        move, add, current = memory.move, memory.add, memory.get_current
+        clear, add_mul = memory.clear, memory.add_mul
+        ip, n = program.i_ptr, len(ops)
+        while ip < n:
+            op, arg = ops[ip]
+            if op == OP_ADD:
+                add(arg)
+            elif op == OP_MOVE:
+                move(arg)
+            elif op == OP_JNZ:
+                if current():
+                    ip = jumps[ip]
+            elif op == OP_JZ:
+                if not current():
+                    ip = jumps[ip]
+            elif op == OP_CLEAR:
+                clear()
+            elif op == OP_ADD_MUL:
+                add_mul(*arg)
+            elif op == OP_OUT:
+                write(arg)
+            else:
+                read(arg)
+            ip += 1
+        program.i_ptr = ip
         return 0
 
 if __name__ == "__main__":
@@ -1,210 +1,179 @@
-from collections import defaultdict, deque
+from collections import deque
+from itertools import product
 
 POSITIONAL_MODE = 0
 IMMEDIATE_MODE = 1
 RELATIVE_MODE = 2
 
 
-class Operator:
-    OP_CODE = 0
-    OP_LEN = 0
-
-    def __init__(self, computer):
-        self.computer = computer
-        self.ptr = computer.ptr
-        self.args = [self.computer.memory[self.ptr+1+i] for i in range(self.OP_LEN-1)]
-        self.modes = self.get_modes(self.args)
-
-    def __repr__(self):
-        status = ''
-        status += f'Code: {self.OP_CODE}\n'
-        status += f'Args: {self.args}\n'
-        status += f'Modes: {self.modes}\n'
-        return status
-
-    def get_modes(self, args):
-        raw_opcode = self.computer.memory[self.ptr]
-        full_opcode = str(raw_opcode).zfill(5)
-        params = list(map(int, full_opcode[:-2]))[::-1]
-        return params
-
-    def get_param(self, i):
-        mode = self.modes[i]
-        if mode == POSITIONAL_MODE:
-            return self.computer.memory[self.args[i]]
-        elif mode == IMMEDIATE_MODE:
-            return self.args[i]
-        elif mode == RELATIVE_MODE:
-            return self.computer.memory[self.args[i] + self.computer.relative_base]
-
-    def write(self, val):
-        mode = self.modes[0] if self.OP_CODE == 3 else self.modes[-1]
-
-        if mode == POSITIONAL_MODE:
-            target = self.args[-1]
-            self.computer.memory[target] = val
-        elif mode == IMMEDIATE_MODE:
-            raise ValueError('Cannot write in immediate mode!')
-        elif mode == RELATIVE_MODE:
-            target = self.args[-1]
-            self.computer.memory[target + self.computer.relative_base] = val
-
+class InStream:
+    def __init__(self):
+        self.buffer = deque()
 
-class MathOperator(Operator):
-    OP_LEN = 4
+    def add(self, inp):
+        self.buffer.append(inp)
 
-    def calculate(self, a, b):
-        raise NotImplementedError
+    def get(self):
+        if self.buffer:
+            return self.buffer.popleft()
+        else:
+            raise RuntimeError('Cannot read from empty input.')
 
-    def execute(self):
-        a, b = self.get_param(0), self.get_param(1)
-        val = self.calculate(a, b)
-        self.write(val)
 
+class OutStream:
+    def __init__(self):
+        self.buffer = deque()
 
-class OperatorAdd(MathOperator):
-    OP_CODE = 1
+    def put(self, val):
+        self.buffer.append(val)
 
-    def calculate(self, a, b):
-        return a + b
+    def get(self):
+        if self.buffer:
+            return self.buffer.popleft()
+        else:
+            raise RuntimeError('Cannot output from empty output stream.')
 
 
-class OperatorMul(MathOperator):
-    OP_CODE = 2
+def get_param(computer, mode, i):
+    # i-th parameter (1-based) of the instruction at computer.ptr
+    arg = computer.read(computer.ptr+i)
+    if mode == POSITIONAL_MODE:
+        return computer.read(arg)
+    elif mode == IMMEDIATE_MODE:
+        return arg
+    elif mode == RELATIVE_MODE:
+        return computer.read(arg + computer.relative_base)
 
-    def calculate(self, a, b):
-        return a * b
 
+def write_param(computer, mode, i, val):
+    target = computer.read(computer.ptr+i)
+    if mode == POSITIONAL_MODE:
+        computer.write(target, val)
+    elif mode == IMMEDIATE_MODE:
+        raise ValueError('Cannot write in immediate mode!')
+    elif mode == RELATIVE_MODE:
+        computer.write(target + computer.relative_base, val)
 
-class OperatorInp(Operator):
-    OP_CODE = 3
-    OP_LEN = 2
 
-    def execute(self):
-        val = self.computer.input.get()
-        self.write(val)
+# Operators are plain functions: they get the computer and the three decoded modes,
+# read their arguments from memory and leave the pointer at the next instruction.
 
+def op_add(computer, m0, m1, m2):
+    write_param(computer, m2, 3, get_param(computer, m0, 1) + get_param(computer, m1, 2))
+    computer.ptr += 4
 
-class OperatorOut(Operator):
-    OP_CODE = 4
-    OP_LEN = 2
 
-    def execute(self):
-        val = self.get_param(0)
-        self.computer.output.put(val)
-        self.computer.last_operation_output = True
+def op_mul(computer, m0, m1, m2):
+    write_param(computer, m2, 3, get_param(computer, m0, 1) * get_param(computer, m1, 2))
+    computer.ptr += 4
 
 
-class OperatorJIT(Operator):
-    OP_CODE = 5
-    OP_LEN = 3
+def op_inp(computer, m0, m1, m2):
+    write_param(computer, m0, 1, computer.input.get())
+    computer.ptr += 2
 
-    def execute(self):
-        if self.get_param(0):
-            self.computer.ptr = self.get_param(1)
-            self.computer.last_operation_jump = True
 
+def op_out(computer, m0, m1, m2):
+    computer.output.put(get_param(computer, m0, 1))
+    computer.last_operation_output = True
+    computer.ptr += 2
 
-class OperatorJIF(Operator):
-    OP_CODE = 6
-    OP_LEN = 3
 
-    def execute(self):
-        if not self.get_param(0):
-            self.computer.ptr = self.get_param(1)
-            self.computer.last_operation_jump = True
+def op_jit(computer, m0, m1, m2):
+    if get_param(computer, m0, 1):
+        computer.ptr = get_param(computer, m1, 2)
+    else:
+        computer.ptr += 3
 
 
-class OperatorComp(Operator):
-    OP_CODE = 7
-    OP_LEN = 4
+def op_jif(computer, m0, m1, m2):
+    if not get_param(computer, m0, 1):
+        computer.ptr = get_param(computer, m1, 2)
+    else:
+        computer.ptr += 3
 
-    def execute(self):
-        a = self.get_param(0)
-        b = self.get_param(1)
-        if a < b:
-            self.write(1)
-        else:
-            self.write(0)
 
+def op_comp(computer, m0, m1, m2):
+    a, b = get_param(computer, m0, 1), get_param(computer, m1, 2)
+    write_param(computer, m2, 3, 1 if a < b else 0)
+    computer.ptr += 4
 
-class OperatorEquals(Operator):
-    OP_CODE = 8
-    OP_LEN = 4
 
-    def execute(self):
-        a = self.get_param(0)
-        b = self.get_param(1)
-        if a == b:
-            self.write(1)
-        else:
-            self.write(0)
+def op_equals(computer, m0, m1, m2):
+    a, b = get_param(computer, m0, 1), get_param(computer, m1, 2)
+    write_param(computer, m2, 3, 1 if a == b else 0)
+    computer.ptr += 4
 
 
-class OperatorChangeRelativeBase(Operator):
-    OP_CODE = 9
-    OP_LEN = 2
+def op_change_relative_base(computer, m0, m1, m2):
+    computer.relative_base += get_param(computer, m0, 1)
+    computer.ptr += 2
 
-    def execute(self):
-        val = self.get_param(0)
-        self.computer.relative_base += val
 
+def op_eof(computer, m0, m1, m2):
+    computer.running = False
 
-class OperatorEOF(Operator):
-    OP_CODE = 99
-    OP_LEN = 1
 
-    def execute(self):
-        raise StopIteration
+OP_HANDLERS = {
+    1: op_add,
+    2: op_mul,
+    3: op_inp,
+    4: op_out,
+    5: op_jit,
+    6: op_jif,
+    7: op_comp,
+    8: op_equals,
+    9: op_change_relative_base,
+    99: op_eof
+}
+# indexed by opcode, None for the unused ones
+OP_DISPATCH = tuple(OP_HANDLERS.get(opcode) for opcode in range(100))
 
+OP_LENGTHS = {1: 4, 2: 4, 3: 2, 4: 2, 5: 3, 6: 3, 7: 4, 8: 4, 9: 2, 99: 1}
 
-class InStream:
-    def __init__(self):
-        self.buffer = deque()
 
-    def add(self, inp):
-        self.buffer.append(inp)
+def build_decode_table():
+    # every valid raw opcode (operation + three mode digits) mapped to its opcode and modes,
+    # so nothing has to be parsed while a program runs
+    table = {}
+    for opcode in OP_LENGTHS:
+        for modes in product((POSITIONAL_MODE, IMMEDIATE_MODE, RELATIVE_MODE), repeat=3):
+            raw_opcode = opcode + 100 * modes[0] + 1000 * modes[1] + 10000 * modes[2]
+            table[raw_opcode] = (opcode, modes)
+    return table
 
-    def get(self):
-        if self.buffer:
-            return self.buffer.popleft()
-        else:
-            raise RuntimeError('Cannot read from empty input.')
 
+DECODE_TABLE = build_decode_table()
 
-class OutStream:
-    def __init__(self):
-        self.buffer = []
+WRITING_OPS = {1, 2, 3, 7, 8}
 
-    def put(self, val):
-        self.buffer.append(val)
 
-    def get(self):
-        if self.buffer:
-            return self.buffer.pop()
-        else:
-            raise RuntimeError('Cannot output from empty output stream.')
+def build_access_table():
+    # the fast loop's view of DECODE_TABLE: the mode of every parameter resolved into flags
+    # up front (dereference it? add the relative base?), plus how the write target is addressed,
+    # so the hot loop never compares modes
+    table = {}
+    for raw_opcode, (opcode, modes) in DECODE_TABLE.items():
+        target_mode = modes[OP_LENGTHS[opcode]-2] if opcode in WRITING_OPS else POSITIONAL_MODE
+        table[raw_opcode] = (opcode,
+                             modes[0] != IMMEDIATE_MODE, modes[0] == RELATIVE_MODE,
+                             modes[1] != IMMEDIATE_MODE, modes[1] == RELATIVE_MODE,
+                             target_mode == RELATIVE_MODE, target_mode == IMMEDIATE_MODE)
+    return table
 
 
-OP_DICTIONARY = {1: OperatorAdd,
-                 2: OperatorMul,
-                 3: OperatorInp,
-                 4: OperatorOut,
-                 5: OperatorJIT,
-                 6: OperatorJIF,
-                 7: OperatorComp,
-                 8: OperatorEquals,
-                 9: OperatorChangeRelativeBase,
-                 99: OperatorEOF
-                 }
+ACCESS_TABLE = build_access_table()
 
 
 class Computer():
+    MEMORY_SIZE = 1 << 16
+
     def __init__(self):
-        self.memory = defaultdict(int)
+        self.memory = [0] * self.MEMORY_SIZE
+        self.used_memory = 0  # one past the highest address written so far
         self.ptr = 0
         self.relative_base = 0
-        self.last_operation_jump = False
+        self.last_operation_output = False
         self.input = InStream()
         self.output = OutStream()
         self.running = False
@@ -216,21 +185,48 @@ class Computer():
         status += 'Relative base: {}\n'.format(self.relative_base)
         status += 'InStream: {}\n'.format(self.input.buffer)
         status += 'Output: {}\n'.format(self.output.buffer)
-        status += 'Memory dump: {}\n'.format(self.memory.values())
-        if self.memory:
-            status += str(self._get_current_op())
+        dump = self.memory[:self.used_memory]
+        status += 'Memory dump: {}\n'.format(dump)
+        if dump:
+            opcode, modes = self._decode_current()
+            status += f'Code: {opcode}\n'
+            status += f'Args: {self.memory[self.ptr+1:self.ptr+OP_LENGTHS[opcode]]}\n'
+            status += f'Modes: {modes}\n'
         return status
 
-    def _get_current_op(self):
-        opcode = self.memory[self.ptr] % 100
-        return OP_DICTIONARY[opcode](self)
-
-    def advance(self, op):
-        self.ptr += op.OP_LEN
+    def _reserve(self, address):
+        if address < 0:
+            raise ValueError(f'Cannot access negative address {address}!')
+        while address >= len(self.memory):
+            self.memory.extend([0] * len(self.memory))
+
+    def read(self, address):
+        if address < 0:
+            raise ValueError(f'Cannot access negative address {address}!')
+        try:
+            return self.memory[address]
+        except IndexError:
+            return 0  # never written, so still zero
+
+    def write(self, address, val):
+        if not 0 <= address < len(self.memory):
+            self._reserve(address)
+        self.memory[address] = val
+        if address >= self.used_memory:
+            self.used_memory = address + 1
+
+    def _decode_current(self):
+        raw_opcode = self.read(self.ptr)
+        try:
+            return DECODE_TABLE[raw_opcode]
+        except KeyError:
+            raise ValueError(f'Unknown opcode {raw_opcode} at {self.ptr}!') from None
 
     def load_code(self, code):
-        for i, val in enumerate(code):
-            self.memory[i] = val
+        # one slice copy into the preallocated memory instead of a write per cell
+        self._reserve(max(len(code) - 1, 0))
+        self.memory[:len(code)] = code
+        self.used_memory = max(self.used_memory, len(code))
 
     def read_input(self, val):
         self.input.add(val)
@@ -239,35 +235,158 @@ class Computer():
         return self.output.get()
 
     def reset(self):
-        self.memory = defaultdict(int)
+        self.memory = [0] * self.MEMORY_SIZE
+        self.used_memory = 0  # one past the highest address written so far
         self.ptr = 0
         self.relative_base = 0
-        self.last_operation_jump = False
+        self.last_operation_output = False
         self.input = InStream()
         self.output = OutStream()
         self.running = False
         self.pause_at_output = False
 
+    def _step(self):
+        opcode, modes = self._decode_current()
+        self.last_operation_output = False
+        OP_DISPATCH[opcode](self, *modes)
+
+    def _run_loop(self, pause_at_output):
+        # the same cycle as _step with all the hot state in locals and every operator inlined;
+        # an access past the end of memory raises IndexError before anything has changed,
+        # so that instruction is simply replayed through the checked _step; negative addresses
+        # would silently wrap around in a list, so they are sent the same way to be rejected there
+        memory, access = self.memory, ACCESS_TABLE
+        inp, out = self.input.buffer, self.output.buffer
+        ptr, rb, used = self.ptr, self.relative_base, self.used_memory
+        self.last_operation_output = False
+        try:
+            while True:
+                try:
+                    try:
+                        op, d0, r0, d1, r1, rel_target, bad_target = access[memory[ptr]]
+                    except KeyError:
+                        raise ValueError(f'Unknown opcode {memory[ptr]} at {ptr}!') from None
+
+                    if op == 1 or op == 2 or op == 7 or op == 8:
+                        a = memory[ptr+1]
+                        if d0:
+                            if r0:
+                                a += rb
+                            if a < 0:
+                                raise IndexError(a)
+                            a = memory[a]
+                        b = memory[ptr+2]
+                        if d1:
+                            if r1:
+                                b += rb
+                            if b < 0:
+                                raise IndexError(b)
+                            b = memory[b]
+                        target = memory[ptr+3]
+                        if rel_target:
+                            target += rb
+                        elif bad_target:
+                            raise ValueError('Cannot write in immediate mode!')
+                        if target < 0:
+                            raise IndexError(target)
+                        if target >= used:
+                            used = target + 1
+                        if op == 1:
+                            memory[target] = a + b
+                        elif op == 2:
+                            memory[target] = a * b
+                        elif op == 7:
+                            memory[target] = 1 if a < b else 0
+                        else:
+                            memory[target] = 1 if a == b else 0
+                        ptr += 4
+                    elif op == 5 or op == 6:
+                        a = memory[ptr+1]
+                        if d0:
+                            if r0:
+                                a += rb
+                            if a < 0:
+                                raise IndexError(a)
+                            a = memory[a]
+                        if (op == 5 and a) or (op == 6 and not a):
+                            b = memory[ptr+2]
+                            if d1:
+                                if r1:
+                                    b += rb
+                                if b < 0:
+                                    raise IndexError(b)
+                                b = memory[b]
+                            ptr = b
+                            if ptr < 0:
+                                raise IndexError(ptr)  # _step then fails fetching from it
+                        else:
+                            ptr += 3
+                    elif op == 3:
+                        target = memory[ptr+1]
+                        if rel_target:
+                            target += rb
+                        elif bad_target:
+                            raise ValueError('Cannot write in immediate mode!')
+                        if target < 0:
+                            raise IndexError(target)
+                        if target >= used:
+                            used = target + 1
+                        if not inp:
+                            raise RuntimeError('Cannot read from empty input.')
+                        memory[target] = inp[0]
+                        inp.popleft()
+                        ptr += 2
+                    elif op == 4:
+                        a = memory[ptr+1]
+                        if d0:
+                            if r0:
+                                a += rb
+                            if a < 0:
+                                raise IndexError(a)
+                            a = memory[a]
+                        out.append(a)
+                        ptr += 2
+                        if pause_at_output:
+                            self.last_operation_output = True
+                            return
+                    elif op == 9:
+                        a = memory[ptr+1]
+                        if d0:
+                            if r0:
+                                a += rb
+                            if a < 0:
+                                raise IndexError(a)
+                            a = memory[a]
+                        rb += a
+                        ptr += 2
+                    else:
+                        self.running = False
+                        self.last_operation_output = False
+                        return
+
+                except IndexError:
+                    self.ptr, self.relative_base, self.used_memory = ptr, rb, used
+                    self._step()
+                    ptr, rb, used = self.ptr, self.relative_base, self.used_memory
+                    if not self.running or (pause_at_output and self.last_operation_output):
+                        return
+        finally:
+            self.ptr, self.relative_base, self.used_memory = ptr, rb, used
+
     def run(self, noun=0, verb=0, pause_at_output=False, debug=False):
         if noun:
-            self.memory[1] = noun
+            self.write(1, noun)
         if verb:
-            self.memory[2] = verb
+            self.write(2, verb)
 
         self.running = True
 
+        if not debug:
+            self._run_loop(pause_at_output)
+            return
+
         while self.running:
-            try:
-                if debug:
-                    print(self.__repr__())
-                op = self._get_current_op()
-                self.last_operation_jump = False
-                self.last_operation_output = False
-                op.execute()
-                if not self.last_operation_jump:
-                    self.advance(op)
-                if pause_at_output and self.last_operation_output:
-                    break
-
-            except StopIteration:
-                self.running = False
+            print(self.__repr__())
+            self._step()
+            if pause_at_output and self.last_operation_output:
+                break
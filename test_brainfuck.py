@@ -0,0 +1,148 @@
+import os
+import subprocess
+import sys
+import pytest
+import brainfuck
+
+HELLO_WORLD = '++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<.+++.------.--------.>>+.>++.'
+
+BACKENDS = ['compile', 'interpret']
+if brainfuck.load_numba():
+    BACKENDS.append('numba')
+
+
+def run(code, inp='', **kwargs):
+    VM = brainfuck.BrainfuckVM(code, **kwargs)
+    VM.load_input(inp)
+    VM.run_program()
+    return VM
+
+def test_jump_table():
+    program = brainfuck.Program('[]')
+    assert list(program.jump_table) == [1, 0]
+
+def test_comments_are_ignored():
+    program = brainfuck.Program('+ add one, > and move >')
+    assert program.ops == brainfuck.Program('+,>>').ops
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_commented_program(backend, capsys):
+    run('Set the cell to 65 (A): ' + '+' * 65 + '\nprint it twice: ..', backend=backend)
+    assert capsys.readouterr().out == 'AA'
+
+def test_clear_loop_is_folded():
+    program = brainfuck.Program('+++[-]')
+    assert program.ops == ((brainfuck.OP_ADD, 3), (brainfuck.OP_CLEAR, 0))
+
+def test_multiply_loop_is_folded():
+    program = brainfuck.Program('+[->++<]')
+    assert program.ops == ((brainfuck.OP_ADD, 1), (brainfuck.OP_ADD_MUL, (1, 2)), (brainfuck.OP_CLEAR, 0))
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_multiply_loop(backend):
+    VM = run('+++[->++>+++<<]>', backend=backend)
+    assert VM.memory.get_current() == 6
+    VM.memory.move(1)
+    assert VM.memory.get_current() == 9
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_multiply_loop_grows_tape(backend):
+    # the pointer sits on the first cell, so the loop writes to the left of the tape
+    VM = run('<' * (brainfuck.Memory.TAPE_SIZE // 2) + '++[-<+++>]<', backend=backend)
+    assert len(VM.memory.tape) > brainfuck.Memory.TAPE_SIZE
+    assert VM.memory.get_current() == 6
+    assert sum(VM.memory.tape) == 6
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_hello_world(backend, capsys):
+    run(HELLO_WORLD, backend=backend)
+    assert capsys.readouterr().out == 'Hello World!\n'
+
+def test_deep_nesting_falls_back_to_interpreter(capsys):
+    # more nested loops than Python can compile as nested blocks
+    code = '+' * 65 + '[' * 100 + '.[-]' + ']' * 100
+    assert brainfuck.Program(code).get_function() is None
+    VM = run(code, backend='compile')
+    assert VM.program.eof()
+    assert capsys.readouterr().out == 'A'
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_input(backend, capsys):
+    run(',+[-.,+]', 'H4X0R' + chr(255), backend=backend)
+    assert capsys.readouterr().out == 'H4X0R'
+
+def test_in_stream():
+    inp = brainfuck.InStream()
+    inp.add('ab')
+    assert inp.get() == 97
+    inp.add(b'c')
+    assert [inp.get(), inp.get(), inp.get()] == [98, 99, None]
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_input_at_eof_leaves_cell(backend):
+    VM = run('+++,>+++,', 'Ā', backend=backend)
+    assert VM.memory.get_current() == 3
+    VM.memory.move(-1)
+    assert VM.memory.get_current() == 0  # code point 256, masked to the cell size
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_input_between_runs(backend, capsys):
+    VM = run(',.', 'xy', backend=backend)
+    VM.load_code(',.')
+    VM.run_program()
+    assert capsys.readouterr().out == 'xy'
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_wrapping_cells(backend):
+    VM = run('-', backend=backend)
+    assert VM.memory.get_current() == 255
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_tape_grows_left(backend):
+    VM = run('+' + '<' * 70000 + '+', backend=backend)
+    assert VM.memory.get_current() == 1
+    assert sum(VM.memory.tape) == 2
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_finished_program_is_not_rerun(backend):
+    VM = run('+++', backend=backend)
+    VM.run_program()
+    assert VM.memory.get_current() == 3
+
+@pytest.mark.skipif('numba' not in BACKENDS, reason='needs numba and numpy')
+def test_numba_output_buffer_refills(capsys):
+    # more output than the kernel's buffer holds, with input read in between flushes
+    size = brainfuck.BrainfuckVM.OUT_BUFFER_SIZE
+    run('+' * 65 + '.' * (size + 10) + ',.' * 2, 'xy', backend='numba')
+    assert capsys.readouterr().out == 'A' * (size + 10) + 'xy'
+
+def test_output_is_buffered(capsys):
+    out = brainfuck.OutStream()
+    for _ in range(out.FLUSH_THRESHOLD - 1):
+        out.put(65)
+    assert capsys.readouterr().out == ''
+    out.put(66)
+    assert capsys.readouterr().out == 'A' * (out.FLUSH_THRESHOLD - 1) + 'B'
+    assert not out.buffer
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_output_is_flushed_at_the_end(backend, capsys):
+    count = brainfuck.OutStream.FLUSH_THRESHOLD + 10
+    run('+' * 65 + '.' * count, backend=backend)
+    assert capsys.readouterr().out == 'A' * count
+
+def test_wide_cells():
+    VM = run('-', bits=16)
+    assert VM.memory.get_current() == 65535
+
+def test_numba_is_imported_lazily():
+    check = 'import sys, brainfuck; brainfuck.BrainfuckVM("+").run_program(); assert "numba" not in sys.modules'
+    subprocess.run([sys.executable, '-c', check], check=True, cwd=os.path.dirname(os.path.abspath(brainfuck.__file__)))
+
+def test_no_code():
+    with pytest.raises(RuntimeError):
+        brainfuck.BrainfuckVM().run_program()
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        brainfuck.BrainfuckVM(backend='jit')